@@ -1,6 +1,49 @@
+import math
 from typing import List, Tuple, Iterable
 
 
+# Distance from p to the segment a-b
+def _segment_distance(p: Tuple[float, float], a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+
+    # Project onto the segment, clamped to its ends so retraced strokes aren't mistaken for straight lines
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length_sq))
+    return math.hypot(p[0] - (a[0] + t * dx), p[1] - (a[1] + t * dy))
+
+
+# Ramer-Douglas-Peucker: drop waypoints that move the drawn path by no more than tolerance
+def simplify(waypoints: List[Tuple[float, float]], tolerance: float) -> List[Tuple[float, float]]:
+    if tolerance <= 0 or len(waypoints) < 3:
+        return list(waypoints)
+
+    keep = [False] * len(waypoints)
+    keep[0] = keep[-1] = True
+
+    # Iterative, so long drawings don't hit the recursion limit
+    stack = [(0, len(waypoints) - 1)]
+    while stack:
+        first, last = stack.pop()
+        a, b = waypoints[first], waypoints[last]
+
+        # Find the point furthest from the chord
+        worst, worst_dist = -1, tolerance
+        for i in range(first + 1, last):
+            d = _segment_distance(waypoints[i], a, b)
+            if d > worst_dist:
+                worst, worst_dist = i, d
+
+        if worst != -1:
+            keep[worst] = True
+            stack.append((first, worst))
+            stack.append((worst, last))
+
+    return [p for p, k in zip(waypoints, keep) if k]
+
+
 class Alphanumeric:
     width: float
     height: float
@@ -28,6 +71,10 @@ class Alphanumeric:
     def offset(self, offset: Tuple[float, float]):
         return Alphanumeric([tuple(v + o for v, o in zip(coord, offset)) for coord in self.waypoints])
 
+    # Return a copy of this letter with redundant waypoints removed
+    def simplify(self, tolerance: float):
+        return Alphanumeric(simplify(self.waypoints, tolerance))
+
 
 def get_letter(l):
     # Will eventually return an appropriate alphanumeric for the given letter
@@ -41,8 +88,41 @@ def get_letter(l):
         return method()
 
 
+# Lay out a single letter at the cursor, returning its waypoints and the cursor after it
+def place(letter: str, scale: float, cursor: Tuple[float, float],
+          tolerance: float = 0.0) -> Tuple[List[Tuple[float, float]], Tuple[float, float]]:
+    # Get the appropriate letter, and scale it
+    alpha = get_letter(letter).scale(scale)
+
+    # Find its width
+    w = alpha.width
+
+    # Drop waypoints that don't change the shape; done after scaling so tolerance is in drawn units
+    alpha = alpha.simplify(tolerance)
+
+    # Offset it by cursor
+    alpha = alpha.offset(cursor)
+
+    # The next letter goes to the right of this one
+    return alpha.waypoints, (cursor[0] + w, 0)
+
+
+# Drop waypoints from the start of a letter that are within tolerance of where the path already is,
+# so joining letters doesn't add steps that go nowhere
+def join(previous: Tuple[float, float], waypoints: List[Tuple[float, float]],
+         tolerance: float) -> List[Tuple[float, float]]:
+    if tolerance <= 0:
+        return waypoints
+
+    start = 0
+    while start < len(waypoints) and \
+            math.hypot(waypoints[start][0] - previous[0], waypoints[start][1] - previous[1]) <= tolerance:
+        start += 1
+    return waypoints[start:]
+
+
 # Convert a string to a sequence of alphanumeric letters
-def write(string: str, scale: float) -> List[Tuple[float, float]]:
+def write(string: str, scale: float, tolerance: float = 0.0) -> List[Tuple[float, float]]:
     # This tracks where we are currently writing
     cursor = (0, 0)
 
@@ -51,23 +131,9 @@ def write(string: str, scale: float) -> List[Tuple[float, float]]:
 
     # Iterate over letters
     for letter in string:
-        # Get the appropriate letter
-        alpha = get_letter(letter)
-
-        # Scale it
-        alpha = alpha.scale(scale)
-
-        # Find its width
-        w = alpha.width
-
-        # Offset it by cursor
-        alpha = alpha.offset(cursor)
-
-        # Append its waypoints to the list
-        waypoints = waypoints + alpha.waypoints
-
-        # Finally, we update the cursor to be to the right of the letter
-        cursor = (cursor[0] + w, 0)
+        # Place the letter and append its waypoints to the list
+        letter_waypoints, cursor = place(letter, scale, cursor, tolerance)
+        waypoints.extend(join(waypoints[-1], letter_waypoints, tolerance))
 
     # Return the full list of waypoints
     return waypoints
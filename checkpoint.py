@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import time
+import zlib
+from typing import List, NamedTuple, Optional, Tuple
+
+# Where progress is saved by default
+CHECKPOINT_PATH = "discodraw.ckpt"
+
+# Write only once at least this many steps have completed, and at most this often (seconds)
+CHECKPOINT_EVERY_STEPS = 16
+CHECKPOINT_MIN_INTERVAL = 1.0
+
+# Changes on every boot. The encoder kernel module starts counting from 0 again after a reboot or power cut
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+
+# Saved progress through a plan
+class Progress(NamedTuple):
+    job: str
+    # Fingerprint of the plan the step index points into
+    plan: str
+    # Index of the next step to run
+    step: int
+    # Encoder ticks the plan was built against
+    tick_base: Tuple[int, int]
+    # Boot the encoder counts (and so tick_base) belong to
+    boot: str
+
+
+# Identifies the current boot, or "" where that isn't available
+def boot_id(path: str = BOOT_ID_PATH) -> str:
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+# Identifies a plan by its length and its steps relative to the tick base, so re-homing doesn't change it
+def fingerprint(program: List[Tuple[int, int]], tick_base: Tuple[int, int]) -> str:
+    crc = 0
+    for a, b in program:
+        crc = zlib.crc32(struct.pack('<qq', a - tick_base[0], b - tick_base[1]), crc)
+    return "{}:{:08x}".format(len(program), crc)
+
+
+# Loads saved progress for the given job and plan, or None if there is none, it's unreadable,
+# or it belongs to a different job or plan
+def load(job: str, plan: str, path: str = CHECKPOINT_PATH) -> Optional[Progress]:
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        progress = Progress(data["job"], data["plan"], int(data["step"]),
+                            (int(data["tick_base"][0]), int(data["tick_base"][1])), str(data["boot"]))
+    except (OSError, ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+    if progress.job != job or progress.plan != plan:
+        return None
+    return progress
+
+
+# Records progress through a plan with batched, fsync-throttled, atomic writes.
+# A write needs both CHECKPOINT_EVERY_STEPS steps and CHECKPOINT_MIN_INTERVAL seconds since the last one,
+# so a crash loses whichever of those took longer, plus the step in flight.
+class Checkpoint:
+    job: str
+    plan: str
+    tick_base: Tuple[int, int]
+    boot: str
+    path: str
+    every_steps: int
+    min_interval: float
+
+    step: int
+    written_step: int
+    written_time: float
+
+    def __init__(self, job: str, plan: str, tick_base: Tuple[int, int], path: str = CHECKPOINT_PATH, step: int = 0,
+                 every_steps: int = CHECKPOINT_EVERY_STEPS, min_interval: float = CHECKPOINT_MIN_INTERVAL):
+        self.job = job
+        self.plan = plan
+        self.tick_base = tick_base
+        self.boot = boot_id()
+        self.path = path
+        self.every_steps = every_steps
+        self.min_interval = min_interval
+        self.step = step
+        self.written_step = -1
+        self.written_time = 0.0
+
+    # Notes that every step before the given index is complete, writing only if the batch is due
+    def record(self, step: int) -> None:
+        self.step = step
+        if step - self.written_step < self.every_steps:
+            return
+        if time.monotonic() - self.written_time < self.min_interval:
+            return
+        self.flush()
+
+    # Writes the latest progress unconditionally
+    def flush(self) -> None:
+        if self.step == self.written_step:
+            return
+
+        # Write to the side and swap in, so a crash mid-write never leaves a torn file
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"job": self.job, "plan": self.plan, "step": self.step, "tick_base": list(self.tick_base),
+                       "boot": self.boot}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+        self.written_step = self.step
+        self.written_time = time.monotonic()
+
+    # Removes the checkpoint once the job has finished
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import asyncio
+import math
+from typing import Callable, Optional, Sequence, Tuple
+
+# Default rate for the control loop, in Hz
+CONTROL_RATE = 1000.0
+
+# Default gains, in percent-of-full-speed per tick of error
+DEFAULT_KP = 0.5
+DEFAULT_KI = 0.05
+DEFAULT_KD = 0.002
+
+
+# Single axis PID with output clamping and conditional-integration anti-windup
+class PID:
+    kp: float
+    ki: float
+    kd: float
+
+    # Clamp on the accumulated integral term's contribution, in output units
+    integral_limit: float
+
+    integral: float
+    last_error: Optional[float]
+
+    def __init__(self, kp: float = DEFAULT_KP, ki: float = DEFAULT_KI, kd: float = DEFAULT_KD,
+                 integral_limit: float = 100.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_limit = integral_limit
+        self.reset()
+
+    def reset(self) -> None:
+        self.integral = 0.0
+        self.last_error = None
+
+    # Returns a signed output in [-limit, limit] for the given error over dt seconds
+    def update(self, error: float, dt: float, limit: float) -> float:
+        derivative = 0.0
+        if self.last_error is not None and dt > 0:
+            derivative = (error - self.last_error) / dt
+        self.last_error = error
+
+        unclamped = self.kp * error + self.integral + self.kd * derivative
+        output = max(-limit, min(limit, unclamped))
+
+        # Only integrate when not saturated, or when the error would pull us back out of saturation
+        if output == unclamped or (unclamped > 0) != (error > 0):
+            self.integral += self.ki * error * dt
+            self.integral = max(-self.integral_limit, min(self.integral_limit, self.integral))
+
+        return output
+
+
+# Timing statistics for a running loop
+class LoopStats:
+    iterations: int
+    overruns: int
+    elapsed: float
+
+    # Running sums of lateness (actual wake time minus deadline), in seconds
+    jitter_sum: float
+    jitter_sq_sum: float
+    jitter_max: float
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.iterations = 0
+        self.overruns = 0
+        self.elapsed = 0.0
+        self.jitter_sum = 0.0
+        self.jitter_sq_sum = 0.0
+        self.jitter_max = 0.0
+
+    def record(self, lateness: float) -> None:
+        self.iterations += 1
+        self.jitter_sum += lateness
+        self.jitter_sq_sum += lateness * lateness
+        self.jitter_max = max(self.jitter_max, lateness)
+
+    @property
+    def rate(self) -> float:
+        # Achieved iterations per second
+        if self.elapsed <= 0:
+            return 0.0
+        return self.iterations / self.elapsed
+
+    @property
+    def jitter_mean(self) -> float:
+        if not self.iterations:
+            return 0.0
+        return self.jitter_sum / self.iterations
+
+    @property
+    def jitter_std(self) -> float:
+        if not self.iterations:
+            return 0.0
+        mean = self.jitter_mean
+        return math.sqrt(max(0.0, self.jitter_sq_sum / self.iterations - mean * mean))
+
+
+# Drift-free periodic scheduler on the asyncio event loop.
+# Deadlines are computed from the start time rather than by chaining sleeps, so late wakeups don't accumulate.
+class ControlLoop:
+    rate: float
+    period: float
+    stats: LoopStats
+
+    # If set, steps run back-to-back with each dt taken from this instead of being paced in real time (for replay)
+    dts: Optional[Callable[[], float]]
+
+    # If set, called with each dt just before the step it's passed to (for recording)
+    on_tick: Optional[Callable[[float], None]]
+
+    def __init__(self, rate: float = CONTROL_RATE, dts: Optional[Callable[[], float]] = None,
+                 on_tick: Optional[Callable[[float], None]] = None):
+        assert rate > 0
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.stats = LoopStats()
+        self.dts = dts
+        self.on_tick = on_tick
+
+    # Calls step(dt) once per period until it returns True
+    async def run(self, step: Callable[[float], bool]) -> None:
+        if self.dts is not None:
+            await self._run_unpaced(step)
+            return
+
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        last = start
+        tick = 0
+
+        while True:
+            now = loop.time()
+            deadline = start + tick * self.period
+            self.stats.record(max(0.0, now - deadline))
+
+            dt = now - last if tick else self.period
+            last = now
+            if self.on_tick is not None:
+                self.on_tick(dt)
+            if step(dt):
+                break
+
+            # Next deadline; if we fell behind by whole periods, skip them instead of bursting to catch up
+            tick += 1
+            now = loop.time()
+            behind = int((now - start) / self.period) - tick
+            if behind > 0:
+                self.stats.overruns += behind
+                tick += behind
+            await asyncio.sleep(max(0.0, start + tick * self.period - now))
+
+        self.stats.elapsed += loop.time() - start
+
+    async def _run_unpaced(self, step: Callable[[float], bool]) -> None:
+        while True:
+            dt = self.dts()
+            self.stats.record(0.0)
+            self.stats.elapsed += dt
+            if self.on_tick is not None:
+                self.on_tick(dt)
+            if step(dt):
+                break
+
+            # Still yield, so other tasks get a look in
+            await asyncio.sleep(0)
+
+
+# Drives a set of motors to encoder targets using one PID per axis
+class PIDController:
+    pids: Sequence[PID]
+    loop: ControlLoop
+
+    # Axis is settled once its error is within tolerance for this many consecutive iterations
+    tolerance: int
+    settle_iterations: int
+
+    def __init__(self, pids: Sequence[PID], loop: Optional[ControlLoop] = None, tolerance: int = 64,
+                 settle_iterations: int = 10):
+        self.pids = pids
+        self.loop = loop if loop is not None else ControlLoop()
+        self.tolerance = tolerance
+        self.settle_iterations = settle_iterations
+
+    async def goto(self, read: Callable[[], Tuple[int, ...]], motors: Sequence, dests: Sequence[int],
+                   limits: Sequence[float]) -> None:
+        for pid in self.pids:
+            pid.reset()
+        settled = [0] * len(motors)
+
+        def step(dt: float) -> bool:
+            positions = read()
+            for i, motor in enumerate(motors):
+                error = dests[i] - positions[i]
+
+                # Once settled, stop and hold; we don't resume an axis mid-step
+                if settled[i] >= self.settle_iterations:
+                    continue
+                if abs(error) <= self.tolerance:
+                    settled[i] += 1
+                    if settled[i] >= self.settle_iterations:
+                        motor.stop()
+                        continue
+                else:
+                    settled[i] = 0
+
+                speed = self.pids[i].update(error, dt, limits[i])
+                if speed > 0:
+                    motor.forward(speed)
+                elif speed < 0:
+                    motor.reverse(-speed)
+                else:
+                    motor.stop()
+
+            return all(s >= self.settle_iterations for s in settled)
+
+        await self.loop.run(step)
@@ -2,17 +2,40 @@ from __future__ import annotations
 
 import asyncio
 import math
+import os
+import sys
 import time
 import ALPHANUMERIC
-from dataclasses import dataclass
-from typing import Iterable, Tuple, List
+import checkpoint
+import encoder_trace
+import motors
+from control import CONTROL_RATE, ControlLoop, PID, PIDController
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Tuple, List, NamedTuple, Optional
 
-# import RPIO as GPIO
-import RPi.GPIO as GPIO
+if TYPE_CHECKING:
+    from MotorShield import PiMotor as pimotor
 
-from MotorShield import PiMotor as pimotor
+# Hardware is only touched by setup_hardware(), called from main(), so the planning and control code
+# (and encoder_trace replay) import fine on machines without RPi.GPIO or the MotorShield
+GPIO = None
+spinner_motor = None
+slider_motor = None
+
+
+def setup_hardware() -> None:
+    global GPIO, spinner_motor, slider_motor
+
+    # import RPIO as GPIO
+    import RPi.GPIO as gpio
+    from MotorShield import PiMotor as pimotor
+
+    gpio.setmode(gpio.BOARD)
+    GPIO = gpio
+
+    # Create motorstates using the gpio
+    spinner_motor = pimotor.Motor("MOTOR1", 1)
+    slider_motor = pimotor.Motor("MOTOR2", 1)
 
-GPIO.setmode(GPIO.BOARD)
 
 # setup LED pins
 # leftLED_pin = 13  # pin33
@@ -48,21 +71,72 @@ STEP_DELTA_ROTATION = 2 * math.pi / STEPS_FOR_FULL_ROTATION
 STEP_TIME = 0.01
 
 
-# Represents a cartesian coordinate
-@dataclass
+# Allocation-free conversions for hot loops; these work on bare floats and return plain tuples.
+# Cartesian and Polar delegate to them, and the planners use them directly
+def cartesian_to_polar(x: float, y: float) -> Tuple[float, float]:
+    return math.sqrt(x * x + y * y), math.atan2(y, x)
+
+
+def polar_to_cartesian(r: float, theta: float) -> Tuple[float, float]:
+    return r * math.cos(theta), r * math.sin(theta)
+
+
+def canonical_polar(r: float, theta: float) -> Tuple[float, float]:
+    # Fix negative
+    if r < 0:
+        r = -r
+        theta = theta + math.pi
+
+    # Fix t to be in pi thru -pi
+    cull_count = math.trunc(theta / math.pi)
+    theta = theta - (cull_count * math.pi * 2)
+    return r, theta
+
+
+def segment_points(x: float, y: float, max_length: float) -> List[Tuple[float, float]]:
+    # Breaks the vector (x, y) into a list of smaller vectors representing the steps betwixt
+    min_req = math.ceil(math.sqrt(x * x + y * y) / max_length)
+    sx = x * (1/min_req)
+    sy = y * (1/min_req)
+    return [(sx * (i+1), sy * (i+1)) for i in range(min_req)]
+
+
+# Represents a cartesian coordinate. Slotted and immutable: operations return new coordinates
 class Cartesian:
+    __slots__ = ('x', 'y')
+
     x: float
     y: float
 
+    def __init__(self, x: float, y: float):
+        # Writes go straight to the slots, as __setattr__ refuses them
+        _set_cartesian_x(self, x)
+        _set_cartesian_y(self, y)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("Cartesian is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Cartesian is immutable")
+
+    def __repr__(self) -> str:
+        return "Cartesian(x={!r}, y={!r})".format(self.x, self.y)
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not Cartesian:
+            return NotImplemented
+        return self.x == other.x and self.y == other.y
+
+    def __hash__(self) -> int:
+        return hash((Cartesian, self.x, self.y))
+
     @property
     def mag(self) -> float:
         return math.sqrt(self.x * self.x + self.y * self.y)
 
     @property
     def polar(self) -> Polar:
-        r = self.mag
-        t = math.atan2(self.y, self.x)
-        return Polar(r, t)
+        return Polar(*cartesian_to_polar(self.x, self.y))
 
     def __add__(self, other: Cartesian) -> Cartesian:
         return Cartesian(self.x + other.x, self.y + other.y)
@@ -75,45 +149,80 @@ class Cartesian:
 
     def segment(self, max_length: float) -> List[Cartesian]:
         # Breaks this cartesian coordinate into a list of smaller coordinates representing the steps betwixt
-        length = self.mag
-        min_req = math.ceil(length / max_length)
-        seg = self * (1/min_req)
-        results = []
-        for i in range(min_req):
-            results.append(seg * (i+1))
-        return results
+        return [Cartesian(x, y) for x, y in segment_points(self.x, self.y, max_length)]
+
 
+_set_cartesian_x = Cartesian.x.__set__
+_set_cartesian_y = Cartesian.y.__set__
 
-# Represents a polar coordinate
-@dataclass
+
+# Represents a polar coordinate. Slotted and immutable: operations return new coordinates
 class Polar:
+    __slots__ = ('r', 'theta')
+
     r: float
     theta: float
 
-    @property
-    def canonical(self) -> Polar:
-        r = self.r
-        t = self.theta
+    def __init__(self, r: float, theta: float):
+        # Writes go straight to the slots, as __setattr__ refuses them
+        _set_polar_r(self, r)
+        _set_polar_theta(self, theta)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("Polar is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Polar is immutable")
 
-        # Fix negative
-        if r < 0:
-            r = -r
-            t = t + math.pi
+    def __repr__(self) -> str:
+        return "Polar(r={!r}, theta={!r})".format(self.r, self.theta)
 
-        # Fix t to be in pi thru -pi
-        cull_count = math.trunc(t / math.pi)
-        t = t - (cull_count * math.pi * 2)
-        return Polar(r, t)
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not Polar:
+            return NotImplemented
+        return self.r == other.r and self.theta == other.theta
+
+    def __hash__(self) -> int:
+        return hash((Polar, self.r, self.theta))
+
+    @property
+    def canonical(self) -> Polar:
+        return Polar(*canonical_polar(self.r, self.theta))
 
     @property
     def cartesian(self) -> Cartesian:
-        x = self.r * math.cos(self.theta)
-        y = self.r * math.sin(self.theta)
-        return Cartesian(x, y)
+        return Cartesian(*polar_to_cartesian(self.r, self.theta))
 
     # Imaginary multiplication
     def cmul(self, other: Polar) -> Polar:
-        return Polar(self.r * other.r, self.theta + other.theta).canonical
+        return Polar(*canonical_polar(self.r * other.r, self.theta + other.theta))
+
+
+_set_polar_r = Polar.r.__set__
+_set_polar_theta = Polar.theta.__set__
+
+
+# Converts a move betwixt two polar coordinates into a change in (spinner, slider) ticks
+def delta_ticks(source: Polar, target: Polar) -> Tuple[int, int]:
+    # Find the change in angle/radius we need to make
+    delta_angle = target.theta - source.theta
+    delta_radius = target.r - source.r
+
+    # Convert to changes in ticks
+    return int(delta_angle / STEP_DELTA_ROTATION), int(delta_radius / STEP_DELTA_RADIUS)
+
+
+# Ticks after each move through a run of (r, theta) points, starting at (r, theta), relative to the ticks there.
+# Same arithmetic as delta_ticks, on bare floats, so long paths don't build a Polar per waypoint
+def ticks_along(points: Iterable[Tuple[float, float]], r: float, theta: float) -> List[Tuple[int, int]]:
+    steps = []
+    t0, t1 = 0, 0
+    for pr, pt in points:
+        t0 += int((pt - theta) / STEP_DELTA_ROTATION)
+        t1 += int((pr - r) / STEP_DELTA_RADIUS)
+        steps.append((t0, t1))
+        r, theta = pr, pt
+    return steps
 
 
 # Class to plan out motions
@@ -121,20 +230,15 @@ class Plan:
     position_polar: Polar
     position_ticks: Tuple[int, int]
 
-    program: List[Tuple[int, int]] = []
+    program: List[Tuple[int, int]]
 
     def __init__(self, initial_pos: Polar, initial_ticks: Tuple[int, int]):
         self.position_polar = initial_pos
         self.position_ticks = initial_ticks
+        self.program = []
 
     def goto_polar(self, target_coord: Polar):
-        # Find the change in angle/radius we need to make
-        delta_angle = target_coord.theta - self.position_polar.theta
-        delta_radius = target_coord.r - self.position_polar.r
-
-        # Convert to changes in ticks
-        delta_spinnner_tick = int(delta_angle / STEP_DELTA_ROTATION)
-        delta_slide_tick = int(delta_radius / STEP_DELTA_RADIUS)
+        delta_spinnner_tick, delta_slide_tick = delta_ticks(self.position_polar, target_coord)
 
         # Find new target ticks
         self.position_ticks = (self.position_ticks[0] + delta_spinnner_tick,
@@ -146,10 +250,154 @@ class Plan:
         # Update our polar as well
         self.position_polar = target_coord
 
+    # Same as goto_polar for each of a run of (r, theta) points
+    def goto_points(self, points: List[Tuple[float, float]]) -> None:
+        if not points:
+            return
+        t0, t1 = self.position_ticks
+        self.program.extend([(t0 + s0, t1 + s1)
+                             for s0, s1 in ticks_along(points, self.position_polar.r, self.position_polar.theta)])
+        self.position_ticks = self.program[-1]
+        self.position_polar = Polar(*points[-1])
+
     def __iter__(self) -> Iterable[Tuple[int, int]]:
         yield from self.program
 
 
+# Maps written (x, y) waypoints onto the table as (r, theta)
+def text_to_polar(x: float, y: float) -> Tuple[float, float]:
+    return y * 0.1, 5 + x
+
+
+# One letter's worth of a text plan, independent of where in the text it sits
+class PlannedGlyph(NamedTuple):
+    letter: str
+    key: Tuple[str, float, Tuple[float, float]]
+    # Ticks for each waypoint, relative to the ticks at the end of the previous letter
+    steps: List[Tuple[int, int]]
+    # Last waypoint, relative to this letter's cursor, and how far the cursor moves past this letter
+    last: Tuple[float, float]
+    width: float
+
+
+# Plans text the same way as ALPHANUMERIC.write + Plan.goto_points, but re-plans only what an edit changed.
+# Letters are planned relative to their own cursor and starting ticks, so a planned letter depends only on the letter
+# and where the previous one left off. That holds when moving along x only shifts the angle, as with text_to_polar.
+# The unchanged prefix and suffix of the text are reused as-is; absolute ticks are only worked out in plan().
+class IncrementalPlanner:
+    initial_pos: Polar
+    initial_ticks: Tuple[int, int]
+    scale: float
+    tolerance: float
+    to_polar: Callable[[float, float], Tuple[float, float]]
+
+    # Where ALPHANUMERIC.write's leading cursor waypoint lands
+    origin_cursor: Tuple[float, float]
+    origin_polar: Polar
+    origin_ticks: Tuple[int, int]
+
+    text: str
+    glyphs: List[PlannedGlyph]
+
+    # (letter, scale, incoming point relative to the cursor) -> planned letter.
+    # Only entries used by the current glyphs are kept
+    cache: Dict[Tuple[str, float, Tuple[float, float]], PlannedGlyph]
+
+    def __init__(self, initial_pos: Polar, initial_ticks: Tuple[int, int], scale: float,
+                 to_polar: Callable[[float, float], Tuple[float, float]] = text_to_polar, tolerance: float = 0.0):
+        self.initial_pos = initial_pos
+        self.initial_ticks = initial_ticks
+        self.scale = scale
+        self.tolerance = tolerance
+        self.to_polar = to_polar
+        self.text = ""
+        self.glyphs = []
+        self.cache = {}
+
+        # ALPHANUMERIC.write always starts with the cursor itself
+        self.origin_cursor = (0, 0)
+        self.origin_polar = Polar(*to_polar(*self.origin_cursor))
+        d = delta_ticks(initial_pos, self.origin_polar)
+        self.origin_ticks = (initial_ticks[0] + d[0], initial_ticks[1] + d[1])
+
+    # Key for a letter following the given glyphs
+    def _key(self, letter: str, glyphs: List[PlannedGlyph]) -> Tuple[str, float, Tuple[float, float]]:
+        if not glyphs:
+            return letter, self.scale, (0.0, 0.0)
+        g = glyphs[-1]
+        return letter, self.scale, (g.last[0] - g.width, g.last[1])
+
+    def _plan_glyph(self, key: Tuple[str, float, Tuple[float, float]]) -> PlannedGlyph:
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+
+        letter, scale, incoming = key
+        waypoints, end_cursor = ALPHANUMERIC.place(letter, scale, (0, 0), self.tolerance)
+        waypoints = ALPHANUMERIC.join(incoming, waypoints, self.tolerance)
+        steps = ticks_along([self.to_polar(*p) for p in waypoints], *self.to_polar(*incoming))
+
+        # A letter may be joined away entirely, leaving the path where the previous one ended
+        last = waypoints[-1] if waypoints else incoming
+        glyph = PlannedGlyph(letter, key, steps, last, end_cursor[0])
+        self.cache[key] = glyph
+        return glyph
+
+    # Re-plans for the given text, reusing whatever is unchanged from the last call
+    def update(self, text: str) -> Plan:
+        old = self.glyphs
+
+        # Letters before the first change and after the last change are unchanged
+        prefix = len(os.path.commonprefix([self.text, text]))
+        limit = min(len(self.text), len(text)) - prefix
+        suffix = len(os.path.commonprefix([self.text[::-1][:limit], text[::-1][:limit]]))
+
+        glyphs = old[:prefix]
+
+        # Plan the changed region
+        for letter in text[prefix:len(text) - suffix]:
+            glyphs.append(self._plan_glyph(self._key(letter, glyphs)))
+
+        # Carry over the suffix. Once a letter arrives from the same place as before, so does every one after it
+        tail = old[len(old) - suffix:]
+        for j, g in enumerate(tail):
+            key = self._key(g.letter, glyphs)
+            if key == g.key:
+                glyphs.extend(tail[j:])
+                break
+            glyphs.append(self._plan_glyph(key))
+
+        self.text = text
+        self.glyphs = glyphs
+
+        # Drop cache entries no letter uses any more
+        self.cache = {g.key: g for g in glyphs}
+        return self.plan()
+
+    # Assembles the current glyphs into a Plan
+    def plan(self) -> Plan:
+        p = Plan(self.initial_pos, self.initial_ticks)
+        p.program.append(self.origin_ticks)
+        p.position_polar = self.origin_polar
+        p.position_ticks = self.origin_ticks
+        if not self.glyphs:
+            return p
+
+        t0, t1 = self.origin_ticks
+        cursor = self.origin_cursor[0]
+        start = cursor
+        for g in self.glyphs:
+            p.program.extend([(t0 + s0, t1 + s1) for s0, s1 in g.steps])
+            t0, t1 = p.program[-1]
+            start = cursor
+            cursor = cursor + g.width
+
+        g = self.glyphs[-1]
+        p.position_polar = Polar(*self.to_polar(start + g.last[0], g.last[1]))
+        p.position_ticks = (t0, t1)
+        return p
+
+
 DEFAULT_START_POS = Cartesian(RADIUS_MIN, 0).polar
 
 # Encoder sequence
@@ -188,15 +436,39 @@ class EncoderTracker:
     motor1: pimotor.Motor
     motor2: pimotor.Motor
 
-    def __init__(self, motor1: pimotor.Motor, motor2: pimotor.Motor):
+    # If set, closed-loop PID control replaces the on/off control law; speeds become output limits
+    controller: Optional[PIDController]
+
+    # Where encoder positions come from, and how long to sleep twixt iterations; swapped out for replay
+    read: Callable[[], Tuple[int, int]]
+    step_time: float
+
+    # If set, every target is logged to it
+    recorder: Optional[encoder_trace.TraceRecorder]
+
+    def __init__(self, motor1: pimotor.Motor, motor2: pimotor.Motor, controller: Optional[PIDController] = None,
+                 read: Optional[Callable[[], Tuple[int, int]]] = None, step_time: float = STEP_TIME,
+                 recorder: Optional[encoder_trace.TraceRecorder] = None):
         # Store the motors
         self.motor1 = motor1
         self.motor2 = motor2
+        self.controller = controller
+        self.read = read if read is not None else read_locations
+        self.step_time = step_time
+        self.recorder = recorder
 
     async def goto_destinations(self, motor1_dest: int, motor2_dest: int, spin_speed: int, slide_speed: int):
         assert 0 < spin_speed <= 100
         assert 0 < slide_speed <= 100
 
+        if self.recorder is not None:
+            self.recorder.target(motor1_dest, motor2_dest, spin_speed, slide_speed)
+
+        if self.controller is not None:
+            await self.controller.goto(self.read, (self.motor1, self.motor2),
+                                       (motor1_dest, motor2_dest), (spin_speed, slide_speed))
+            return
+
         # Get the current positions
         done1, done2 = False, False
         tolerance = 64
@@ -204,7 +476,7 @@ class EncoderTracker:
         # Iterate until within tolerance
         while not (done1 and done2):
             # Get current offsets
-            positions = read_locations()
+            positions = self.read()
             d1 = motor1_dest - positions[0]
             d2 = motor2_dest - positions[1]
 
@@ -245,22 +517,66 @@ class EncoderTracker:
                 # GPIO.output(downLED_pin, False)
 
             # Sleep for a bit
-            await asyncio.sleep(STEP_TIME)
+            await asyncio.sleep(self.step_time)
+
+    async def execute(self, p: Plan, spin_speed: int, slide_speed: int,
+                      ckpt: Optional[checkpoint.Checkpoint] = None, start: int = 0) -> None:
+        try:
+            for i, step in enumerate(p.program[start:], start):
+                await self.goto_destinations(step[0], step[1], spin_speed, slide_speed)
+                if ckpt is not None:
+                    ckpt.record(i + 1)
+        finally:
+            # Save wherever we got to, even if we're bailing out
+            if ckpt is not None:
+                ckpt.flush()
 
-    async def execute(self, p: Plan, spin_speed: int, slide_speed: int) -> None:
-        for step in p:
-            await self.goto_destinations(step[0], step[1], spin_speed, slide_speed)
 
+# The main runtime
+def main(resume: bool = False, record: Optional[str] = None, pid_rate: Optional[float] = None,
+         tolerance: float = 0.0):
+    # What we're drawing; a saved checkpoint is only resumed for the same job
+    JOB = 'a'
 
-# Create motorstates using the gpio
-spinner_motor = pimotor.Motor("MOTOR1", 1)
-slider_motor = pimotor.Motor("MOTOR2", 1)
+    setup_hardware()
 
+    # Motor writes go through a worker thread, skipping any that wouldn't change anything
+    worker = motors.MotorWorker()
+    spinner = motors.CoalescingMotor(spinner_motor, worker)
+    slider = motors.CoalescingMotor(slider_motor, worker)
 
-# The main runtime
-def main():
+    # Optionally log everything the tracker sees and does, for replay with encoder_trace
+    recorder = encoder_trace.TraceRecorder(record) if record else None
+
+    # Optionally swap the on/off control law for per-axis PID at the given rate, logging its ticks for replay
+    controller = None
+    if pid_rate:
+        on_tick = recorder.tick if recorder is not None else None
+        controller = PIDController([PID(), PID()], ControlLoop(pid_rate, on_tick=on_tick))
+
+    try:
+        run(resume, JOB, spinner, slider, recorder, controller, tolerance)
+    finally:
+        worker.close()
+        if recorder is not None:
+            recorder.close()
+        print("Motor commands: {} issued, {} coalesced, {} superseded".format(
+            spinner.issued + slider.issued, spinner.coalesced + slider.coalesced, worker.superseded))
+        if controller is not None:
+            stats = controller.loop.stats
+            print("Control loop: {:.1f} Hz achieved of {:.1f} Hz, jitter mean {:.3f} ms, max {:.3f} ms, {} overruns".format(
+                stats.rate, controller.loop.rate, stats.jitter_mean * 1000, stats.jitter_max * 1000, stats.overruns))
+
+
+def run(resume: bool, job: str, spinner: motors.CoalescingMotor, slider: motors.CoalescingMotor,
+        recorder: Optional[encoder_trace.TraceRecorder] = None, controller: Optional[PIDController] = None,
+        tolerance: float = 0.0):
     # Make our corresponding encoders
-    spinner_encoder = EncoderTracker(spinner_motor, slider_motor)
+    if recorder is not None:
+        spinner_encoder = EncoderTracker(recorder.wrap_motor(spinner, 0), recorder.wrap_motor(slider, 1), controller,
+                                         read=recorder.wrap_read(read_locations), recorder=recorder)
+    else:
+        spinner_encoder = EncoderTracker(spinner, slider, controller)
 
     # Get our asyncio event loop
     loop = asyncio.get_event_loop()
@@ -274,13 +590,15 @@ def main():
     print("Attempting run")
     loop.run_until_complete(reset_motion)
 
-    # Spin backwards till we hit root
+    # Spin backwards till we hit root. This polls the limit switch directly, so drive the motor directly too
+    spinner.worker.flush()
     slider_motor.reverse(50)
     GPIO.setup(LIMIT_SWITCH_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
     time.sleep(.3)
     while GPIO.input(LIMIT_SWITCH_PIN):
         pass
     slider_motor.stop()
+    slider.invalidate()
 
     # Save this as the base of the slider
     slider_base = read_locations()[1]
@@ -290,36 +608,74 @@ def main():
     tick_base = (spinner_base, slider_base)
 
     # Make as a plan
-    plan = Plan(DEFAULT_START_POS, tick_base)
-
-    # Now we make what we want to draw
-    # Create all of the points
-    a = ALPHANUMERIC.get_letter('a')
-    points = a.waypoints
-
-    # Convert to polar
-    pol_points = [Polar(p[1]*0.1, 5+p[0]) for p in points]
-
-    # Add to the plan
-    for pol in pol_points:
-        plan.goto_polar(pol)
+    def make_plan(base: Tuple[int, int]) -> Plan:
+        plan = Plan(DEFAULT_START_POS, base)
+
+        # Now we make what we want to draw
+        # Create all of the points
+        # Dropping waypoints that don't change the shape saves a settle per waypoint
+        a = ALPHANUMERIC.get_letter(job)
+        points = ALPHANUMERIC.simplify(a.waypoints, tolerance)
+
+        # Convert to polar and add to the plan
+        plan.goto_points([text_to_polar(p[0], p[1]) for p in points])
+        return plan
+
+    plan = make_plan(tick_base)
+    plan_id = checkpoint.fingerprint(plan.program, tick_base)
+
+    # Pick up where we left off, if asked, and only if it's the same job and plan.
+    # The slider was just re-homed, but the spinner has no switch. Within one boot its encoder count carries on
+    # across a crash, so re-align to the spinner base the job started with. After a reboot or power cut the count
+    # restarted from 0, so the saved base is meaningless: the operator has to put the spinner back by hand
+    start = 0
+    if resume:
+        progress = checkpoint.load(job, plan_id)
+        if progress is None:
+            print("No matching checkpoint, starting from the beginning")
+        else:
+            start = progress.step
+            if progress.boot == checkpoint.boot_id():
+                tick_base = (progress.tick_base[0], slider_base)
+            else:
+                print("The encoders have been reset since the checkpoint was saved.")
+                input("Turn the spinner back to where the job started, then press Enter to resume")
+                tick_base = (read_locations()[0], slider_base)
+            plan = make_plan(tick_base)
+            print("Resuming at step {} of {}".format(start, len(plan.program)))
+    ckpt = checkpoint.Checkpoint(job, plan_id, tick_base, step=start)
 
     # Go for it
-    plan_execution = spinner_encoder.execute(plan, SPIN_SPEED, SLIDE_SPEED)
+    plan_execution = spinner_encoder.execute(plan, SPIN_SPEED, SLIDE_SPEED, ckpt, start)
     loop.run_until_complete(plan_execution)
 
+    # Done, nothing left to resume
+    ckpt.clear()
+
 
 if __name__ == '__main__':
     err = None
     try:
-        main()
+        record_path = sys.argv[sys.argv.index('--record') + 1] if '--record' in sys.argv else None
+
+        # --pid enables the PID control law, at --rate Hz if given
+        pid_rate = None
+        if '--pid' in sys.argv:
+            pid_rate = float(sys.argv[sys.argv.index('--rate') + 1]) if '--rate' in sys.argv else CONTROL_RATE
+
+        # --tolerance simplifies the drawing, dropping waypoints that move it by no more than this
+        tolerance = float(sys.argv[sys.argv.index('--tolerance') + 1]) if '--tolerance' in sys.argv else 0.0
+
+        main(resume='--resume' in sys.argv, record=record_path, pid_rate=pid_rate, tolerance=tolerance)
     except Exception as e:
         err = e
         pass
     finally:
         try:
-            spinner_motor.stop()
-            slider_motor.stop()
+            if spinner_motor is not None:
+                spinner_motor.stop()
+            if slider_motor is not None:
+                slider_motor.stop()
         except RuntimeError:
             pass
         raise err
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+# File layout: header, then records each prefixed by a one byte kind
+MAGIC = b"DDTR"
+VERSION = 2
+_HEADER = struct.Struct('<4sB')
+_KIND = struct.Struct('<B')
+
+# time, spinner ticks, slider ticks
+KIND_READ = 0
+_READ = struct.Struct('<dqq')
+
+# time, motor index, op, speed
+KIND_COMMAND = 1
+_COMMAND = struct.Struct('<dBBf')
+
+# time, spinner dest, slider dest, spin speed, slide speed
+KIND_TARGET = 2
+_TARGET = struct.Struct('<dqqBB')
+
+# time, dt the control loop passed to its step (since version 2)
+KIND_TICK = 3
+_TICK = struct.Struct('<dd')
+
+OPS = ('forward', 'reverse', 'stop')
+
+# How often the recorder pushes buffered records to disk (seconds), so a power cut loses at most this much
+TRACE_FLUSH_INTERVAL = 0.5
+
+
+class TraceError(Exception):
+    pass
+
+
+# Raised during replay when the control law asks for more readings than the trace holds for the current target
+class TraceExhausted(Exception):
+    pass
+
+
+# Logs encoder reads, motor commands, control ticks and targets from a live run into a compact binary trace.
+# Records are written from the control loop, so that only ever hands them to the OS; a background thread fsyncs.
+class TraceRecorder:
+    path: str
+    clock: Callable[[], float]
+    start: float
+    flush_interval: float
+    flushed: float
+
+    syncer: threading.Thread
+    closing: threading.Event
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.monotonic,
+                 flush_interval: float = TRACE_FLUSH_INTERVAL):
+        self.path = path
+        self.clock = clock
+        self.start = clock()
+        self.flush_interval = flush_interval
+        self.flushed = self.start
+        self.file = open(path, 'wb')
+        self.file.write(_HEADER.pack(MAGIC, VERSION))
+
+        self.closing = threading.Event()
+        self.syncer = threading.Thread(target=self._sync, name="TraceSync", daemon=True)
+        self.syncer.start()
+
+    def _now(self) -> float:
+        return self.clock() - self.start
+
+    def _write(self, record: bytes) -> None:
+        self.file.write(record)
+        now = self.clock()
+        if now - self.flushed >= self.flush_interval:
+            self.file.flush()
+            self.flushed = now
+
+    def _sync(self) -> None:
+        while not self.closing.wait(self.flush_interval):
+            os.fsync(self.file.fileno())
+
+    # Pushes everything recorded so far to disk. Blocks, so keep it off the control loop
+    def flush(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    # Returns a read function that logs every position it returns
+    def wrap_read(self, read: Callable[[], Tuple[int, int]]) -> Callable[[], Tuple[int, int]]:
+        def recorded_read() -> Tuple[int, int]:
+            positions = read()
+            self._write(_KIND.pack(KIND_READ) + _READ.pack(self._now(), positions[0], positions[1]))
+            return positions
+        return recorded_read
+
+    # Returns a stand-in for the motor that logs every command before passing it on
+    def wrap_motor(self, motor, index: int) -> RecordingMotor:
+        return RecordingMotor(motor, index, self)
+
+    def command(self, index: int, op: str, speed: Optional[float]) -> None:
+        self._write(_KIND.pack(KIND_COMMAND) +
+                    _COMMAND.pack(self._now(), index, OPS.index(op), speed if speed is not None else 0.0))
+
+    def target(self, motor1_dest: int, motor2_dest: int, spin_speed: int, slide_speed: int) -> None:
+        self._write(_KIND.pack(KIND_TARGET) +
+                    _TARGET.pack(self._now(), motor1_dest, motor2_dest, spin_speed, slide_speed))
+
+    # Logs the dt a ControlLoop hands its step, so replay can hand over the same one; pass as its on_tick
+    def tick(self, dt: float) -> None:
+        self._write(_KIND.pack(KIND_TICK) + _TICK.pack(self._now(), dt))
+
+    def close(self) -> None:
+        self.closing.set()
+        self.syncer.join()
+        self.flush()
+        self.file.close()
+
+
+class RecordingMotor:
+    def __init__(self, motor, index: int, recorder: TraceRecorder):
+        self.motor = motor
+        self.index = index
+        self.recorder = recorder
+
+    def forward(self, speed: float) -> None:
+        self.recorder.command(self.index, 'forward', speed)
+        self.motor.forward(speed)
+
+    def reverse(self, speed: float) -> None:
+        self.recorder.command(self.index, 'reverse', speed)
+        self.motor.reverse(speed)
+
+    def stop(self) -> None:
+        self.recorder.command(self.index, 'stop', None)
+        self.motor.stop()
+
+
+# A recorded motor command, as (time, motor index, op, speed). Speed is None for stop
+Command = Tuple[float, int, str, Optional[float]]
+
+
+# Everything recorded while driving to one target
+class Segment(NamedTuple):
+    time: float
+    dests: Tuple[int, int]
+    speeds: Tuple[int, int]
+    reads: List[Tuple[float, Tuple[int, int]]]
+    commands: List[Command]
+    # Control loop dts, in order
+    dts: List[float]
+
+
+# Loads a trace into per-target segments. Anything recorded before the first target is dropped
+def load(path: str) -> List[Segment]:
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if len(data) < _HEADER.size:
+        raise TraceError("Not a trace: {}".format(path))
+    magic, version = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise TraceError("Unsupported trace: {}".format(path))
+
+    segments = []
+    offset = _HEADER.size
+    while offset < len(data):
+        kind, = _KIND.unpack_from(data, offset)
+        offset += _KIND.size
+
+        # A run that died mid-write may leave a torn final record
+        if kind == KIND_READ:
+            if offset + _READ.size > len(data):
+                break
+            t, one, two = _READ.unpack_from(data, offset)
+            offset += _READ.size
+            if segments:
+                segments[-1].reads.append((t, (one, two)))
+        elif kind == KIND_COMMAND:
+            if offset + _COMMAND.size > len(data):
+                break
+            t, index, op, speed = _COMMAND.unpack_from(data, offset)
+            offset += _COMMAND.size
+            if segments:
+                segments[-1].commands.append((t, index, OPS[op], speed if OPS[op] != 'stop' else None))
+        elif kind == KIND_TARGET:
+            if offset + _TARGET.size > len(data):
+                break
+            t, one, two, spin, slide = _TARGET.unpack_from(data, offset)
+            offset += _TARGET.size
+            segments.append(Segment(t, (one, two), (spin, slide), [], [], []))
+        elif kind == KIND_TICK:
+            if offset + _TICK.size > len(data):
+                break
+            t, dt = _TICK.unpack_from(data, offset)
+            offset += _TICK.size
+            if segments:
+                segments[-1].dts.append(dt)
+        else:
+            raise TraceError("Bad record kind {} at offset {}".format(kind, offset - _KIND.size))
+
+    return segments
+
+
+class ReplayMotor:
+    def __init__(self, index: int, backend: ReplayBackend):
+        self.index = index
+        self.backend = backend
+
+    def forward(self, speed: float) -> None:
+        self.backend.command(self.index, 'forward', speed)
+
+    def reverse(self, speed: float) -> None:
+        self.backend.command(self.index, 'reverse', speed)
+
+    def stop(self) -> None:
+        self.backend.command(self.index, 'stop', None)
+
+
+# Feeds recorded encoder positions back in place of read_locations(), one target segment at a time,
+# and collects the commands the control law issues in response. Time comes from the trace, never the wall clock.
+class ReplayBackend:
+    segments: List[Segment]
+    motors: Tuple[ReplayMotor, ReplayMotor]
+
+    # Per segment: reads consumed, dts consumed, and commands issued
+    consumed: List[int]
+    ticked: List[int]
+    commands: List[List[Command]]
+
+    def __init__(self, segments: List[Segment]):
+        self.segments = segments
+        self.motors = (ReplayMotor(0, self), ReplayMotor(1, self))
+        self.consumed = [0] * len(segments)
+        self.ticked = [0] * len(segments)
+        self.commands = [[] for _ in segments]
+        self.current = 0
+        self.now = 0.0
+
+    def begin(self, index: int) -> None:
+        self.current = index
+        self.now = self.segments[index].time
+
+    def read(self) -> Tuple[int, int]:
+        reads = self.segments[self.current].reads
+        i = self.consumed[self.current]
+        if i >= len(reads):
+            raise TraceExhausted("Segment {} ran past its {} recorded reads".format(self.current, len(reads)))
+        self.consumed[self.current] = i + 1
+        self.now, positions = reads[i]
+        return positions
+
+    # Hands out the recorded control loop dts, in place of the live clock; pass as a ControlLoop's dts
+    def next_dt(self) -> float:
+        dts = self.segments[self.current].dts
+        i = self.ticked[self.current]
+        if i >= len(dts):
+            raise TraceExhausted("Segment {} ran past its {} recorded ticks".format(self.current, len(dts)))
+        self.ticked[self.current] = i + 1
+        return dts[i]
+
+    def command(self, index: int, op: str, speed: Optional[float]) -> None:
+        # Round speeds as the trace stores them, so they compare equal to recorded commands
+        if speed is not None:
+            speed, = struct.unpack('<f', struct.pack('<f', speed))
+        self.commands[self.current].append((self.now, index, op, speed))
+
+
+class ReplayResult(NamedTuple):
+    segments: List[Segment]
+    # Per segment: reads consumed, and commands issued during replay
+    consumed: List[int]
+    commands: List[List[Command]]
+    # Segments where the control law was still running when the recorded reads ran out
+    exhausted: List[int]
+
+    # Segments whose replayed commands differ from the recorded ones (ignoring timing)
+    @property
+    def diverged(self) -> List[int]:
+        return [i for i, seg in enumerate(self.segments)
+                if [c[1:] for c in self.commands[i]] != [c[1:] for c in seg.commands]]
+
+
+# Runs every recorded target through a tracker built around the replay backend, as fast as possible.
+# make_tracker should return something with EncoderTracker's goto_destinations, reading from backend.read,
+# commanding backend.motors, and not sleeping between iterations.
+async def replay(segments: List[Segment], make_tracker: Callable[[ReplayBackend], object]) -> ReplayResult:
+    backend = ReplayBackend(segments)
+    tracker = make_tracker(backend)
+    exhausted = []
+
+    for i, seg in enumerate(segments):
+        backend.begin(i)
+        try:
+            await tracker.goto_destinations(seg.dests[0], seg.dests[1], seg.speeds[0], seg.speeds[1])
+        except TraceExhausted:
+            exhausted.append(i)
+
+    return ReplayResult(segments, backend.consumed, backend.commands, exhausted)
+
+
+# Replays a trace through EncoderTracker, on- or off-Pi. Use --pid for traces recorded with --pid:
+#   python encoder_trace.py TRACE [--pid]
+def main(argv: List[str]) -> None:
+    # Imported here, as coordinates imports this module
+    from coordinates import EncoderTracker
+    from control import ControlLoop, PID, PIDController
+
+    segments = load(argv[1])
+
+    def make_tracker(backend: ReplayBackend) -> EncoderTracker:
+        controller = None
+        if '--pid' in argv:
+            # The rate only paces live runs; replay steps through the recorded dts
+            controller = PIDController([PID(), PID()], ControlLoop(dts=backend.next_dt))
+        return EncoderTracker(backend.motors[0], backend.motors[1], controller, read=backend.read, step_time=0)
+
+    result = asyncio.run(replay(segments, make_tracker))
+    print("Replayed {} targets, {} reads".format(len(segments), sum(result.consumed)))
+    print("diverged: {}".format(result.diverged))
+    print("exhausted: {}".format(result.exhausted))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
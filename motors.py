@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, Optional, Tuple
+
+# A motor command, as (method name, speed). Speed is None for stop
+Command = Tuple[str, Optional[float]]
+
+# Speeds are PWM duty cycles in percent. Finer steps than this don't visibly change the motor,
+# so commands are rounded to it, letting the near-identical speeds of a closed-loop controller coalesce
+DUTY_RESOLUTION = 1.0
+
+
+# Runs motor commands on a dedicated thread so slow PWM/GPIO writes never block the event loop.
+# Only the latest pending command per motor is kept; anything it replaces was never worth sending.
+class MotorWorker:
+    pending: Dict[object, Command]
+    cond: threading.Condition
+    thread: threading.Thread
+    running: bool
+    busy: bool
+
+    # The first exception a motor write raised; re-raised to whoever submits or flushes next
+    error: Optional[BaseException]
+
+    # Commands replaced by a newer one before they were written
+    superseded: int
+
+    def __init__(self):
+        self.pending = {}
+        self.superseded = 0
+        self.cond = threading.Condition()
+        self.running = True
+        self.busy = False
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="MotorWorker", daemon=True)
+        self.thread.start()
+
+    # Queues a command. It is still queued if an earlier write failed, so a stop gets its chance, but the failure is raised
+    def submit(self, motor, command: Command) -> None:
+        with self.cond:
+            if motor in self.pending:
+                self.superseded += 1
+            self.pending[motor] = command
+            self.cond.notify()
+            if self.error is not None:
+                raise self.error
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                batch = self.pending
+                self.pending = {}
+                self.busy = True
+
+            try:
+                for motor, (method, speed) in batch.items():
+                    # Keep going past a failure, so one bad write doesn't swallow another motor's stop
+                    try:
+                        if speed is None:
+                            getattr(motor, method)()
+                        else:
+                            getattr(motor, method)(speed)
+                    except Exception as e:
+                        with self.cond:
+                            if self.error is None:
+                                self.error = e
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    # Blocks until every submitted command has been written, raising if any write failed
+    def flush(self) -> None:
+        with self.cond:
+            while self.pending or self.busy:
+                self.cond.wait()
+            if self.error is not None:
+                raise self.error
+
+    # Drains outstanding commands and stops the thread
+    def close(self) -> None:
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join()
+
+
+# Stands in for a MotorShield PiMotor.Motor, skipping writes that wouldn't change anything
+class CoalescingMotor:
+    motor: object
+    worker: MotorWorker
+
+    # Commands passed to the worker, and commands skipped because the motor was already in that state
+    issued: int
+    coalesced: int
+
+    last: Optional[Command]
+
+    def __init__(self, motor, worker: MotorWorker):
+        self.motor = motor
+        self.worker = worker
+        self.issued = 0
+        self.coalesced = 0
+
+        # Unknown until we command it ourselves, so the first command always goes out
+        self.last = None
+
+    def _command(self, command: Command) -> None:
+        if command == self.last:
+            self.coalesced += 1
+            return
+        self.last = command
+        self.issued += 1
+        self.worker.submit(self.motor, command)
+
+    def forward(self, speed: float) -> None:
+        self._command(("forward", round(speed / DUTY_RESOLUTION) * DUTY_RESOLUTION))
+
+    def reverse(self, speed: float) -> None:
+        self._command(("reverse", round(speed / DUTY_RESOLUTION) * DUTY_RESOLUTION))
+
+    def stop(self) -> None:
+        self._command(("stop", None))
+
+    # Forget the last state, e.g. after the motor was driven directly
+    def invalidate(self) -> None:
+        self.last = None
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+Point = Tuple[float, float]
+Segment = Tuple[Point, Point]
+
+
+# Converts a flat waypoint stream (as produced by Alphanumeric.waypoints or ALPHANUMERIC.write) into segments
+def segments_from_waypoints(waypoints: Sequence[Iterable[float]]) -> List[Segment]:
+    points = [(float(p[0]), float(p[1])) for p in waypoints]
+    return [(points[i], points[i + 1]) for i in range(len(points) - 1)]
+
+
+# Index over segment endpoints, built once per drawing: a 2-d tree for nearest-endpoint lookups,
+# and a hash of quantized endpoints for duplicate segments.
+# Works equally well on cartesian points or (spinner, slider) tick pairs.
+class SegmentIndex:
+    tolerance: float
+
+    segments: List[Segment]
+
+    # Endpoints, two per segment: endpoint i belongs to segment i // 2
+    points: List[Point]
+    alive: List[bool]
+
+    # The tree, stored per endpoint: each endpoint is one node.
+    # root is -1 when empty; children are -1 when absent; live counts alive endpoints in the subtree.
+    root: int
+    axis: List[int]
+    left: List[int]
+    right: List[int]
+    parent: List[int]
+    live: List[int]
+
+    # Maps quantized, direction-independent segment key -> segment indices sharing it.
+    # Buckets are 2 * tolerance wide, so anything within tolerance is in the same or an adjacent bucket.
+    keys: Dict[Tuple[Tuple[int, int], Tuple[int, int]], List[int]]
+
+    def __init__(self, segments: Iterable[Segment], tolerance: float = 1e-6):
+        assert tolerance > 0
+        self.tolerance = tolerance
+        self.segments = []
+        self.points = []
+        self.alive = []
+        self.root = -1
+        self.axis = []
+        self.left = []
+        self.right = []
+        self.parent = []
+        self.live = []
+        self.keys = {}
+
+        for seg in segments:
+            self.add(seg)
+
+    @classmethod
+    def from_waypoints(cls, waypoints: Sequence[Iterable[float]], tolerance: float = 1e-6) -> SegmentIndex:
+        return cls(segments_from_waypoints(waypoints), tolerance)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def _quantize(self, p: Point) -> Tuple[int, int]:
+        return math.floor(p[0] / (2 * self.tolerance)), math.floor(p[1] / (2 * self.tolerance))
+
+    @staticmethod
+    def _ordered(a: Tuple[int, int], b: Tuple[int, int]) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        # Order endpoints so that a->b and b->a hash the same
+        return (a, b) if a <= b else (b, a)
+
+    def _neighbours(self, p: Point) -> List[Tuple[int, int]]:
+        # The bucket p is in, plus whichever adjacent bucket on each axis is within tolerance
+        step = 2 * self.tolerance
+        qx, qy = self._quantize(p)
+        xs = (qx, qx - 1 if p[0] / step - qx < 0.5 else qx + 1)
+        ys = (qy, qy - 1 if p[1] / step - qy < 0.5 else qy + 1)
+        return [(x, y) for x in xs for y in ys]
+
+    # Adds a segment and returns its index
+    def add(self, seg: Segment) -> int:
+        index = len(self.segments)
+        seg = ((float(seg[0][0]), float(seg[0][1])), (float(seg[1][0]), float(seg[1][1])))
+        self.segments.append(seg)
+        self.points.extend(seg)
+        self.alive.extend((True, True))
+
+        key = self._ordered(self._quantize(seg[0]), self._quantize(seg[1]))
+        self.keys.setdefault(key, []).append(index)
+        return index
+
+    # (Re)builds the tree over every endpoint added so far; alive flags carry over
+    def _build(self) -> None:
+        n = len(self.points)
+        self.axis = [0] * n
+        self.left = [-1] * n
+        self.right = [-1] * n
+        self.parent = [-1] * n
+        self.live = [0] * n
+
+        points = self.points
+        stack = [(list(range(n)), 0, -1, False)]
+        self.root = -1
+        while stack:
+            ids, depth, parent, is_right = stack.pop()
+            if not ids:
+                continue
+            axis = depth % 2
+            ids.sort(key=lambda i: points[i][axis])
+            mid = len(ids) // 2
+            node = ids[mid]
+
+            self.axis[node] = axis
+            self.parent[node] = parent
+            if parent == -1:
+                self.root = node
+            elif is_right:
+                self.right[parent] = node
+            else:
+                self.left[parent] = node
+
+            stack.append((ids[:mid], depth + 1, node, False))
+            stack.append((ids[mid + 1:], depth + 1, node, True))
+
+        # Count alive endpoints per subtree, leaves first
+        for i in range(n):
+            if self.alive[i]:
+                node = i
+                while node != -1:
+                    self.live[node] += 1
+                    node = self.parent[node]
+
+    # Removes a segment's endpoints from the tree so it no longer shows up in nearest_endpoint
+    def discard_endpoints(self, index: int) -> None:
+        if len(self.live) != len(self.points):
+            self._build()
+        for i in (2 * index, 2 * index + 1):
+            if self.alive[i]:
+                self.alive[i] = False
+                node = i
+                while node != -1:
+                    self.live[node] -= 1
+                    node = self.parent[node]
+
+    # Returns the indices of all segments equal to seg (in either direction), with both endpoints within tolerance
+    def duplicates_of(self, seg: Segment) -> List[int]:
+        a, b = seg
+        candidates = set()
+        for qa in self._neighbours(a):
+            for qb in self._neighbours(b):
+                candidates.update(self.keys.get(self._ordered(qa, qb), ()))
+
+        def close(p: Point, q: Point) -> bool:
+            return math.hypot(p[0] - q[0], p[1] - q[1]) <= self.tolerance
+
+        results = []
+        for i in sorted(candidates):
+            c, d = self.segments[i]
+            if (close(a, c) and close(b, d)) or (close(a, d) and close(b, c)):
+                results.append(i)
+        return results
+
+    # Returns groups of segment indices that trace the same segment; each group has 2+ members.
+    # Each group is the first ungrouped segment plus everything within tolerance of it.
+    def duplicate_groups(self) -> List[List[int]]:
+        grouped = [False] * len(self.segments)
+        groups = []
+        for i, seg in enumerate(self.segments):
+            if grouped[i]:
+                continue
+            group = [j for j in self.duplicates_of(seg) if not grouped[j]]
+            for j in group:
+                grouped[j] = True
+            if len(group) > 1:
+                groups.append(group)
+        return groups
+
+    # Returns (endpoint, segment index, distance) of the endpoint closest to p, or None if empty.
+    # Segments for which exclude returns True are skipped.
+    def nearest_endpoint(self, p: Point, exclude=None) -> Optional[Tuple[Point, int, float]]:
+        if len(self.live) != len(self.points):
+            self._build()
+
+        best = -1
+        best_sq = math.inf
+        points, alive, live = self.points, self.alive, self.live
+
+        # Each entry is (node, lower bound on squared distance to anything in its subtree)
+        stack = [(self.root, 0.0)] if self.root != -1 else []
+        while stack:
+            node, bound = stack.pop()
+            if bound >= best_sq or not live[node]:
+                continue
+
+            q = points[node]
+            if alive[node] and (exclude is None or not exclude(node // 2)):
+                d = (q[0] - p[0]) ** 2 + (q[1] - p[1]) ** 2
+                if d < best_sq:
+                    best, best_sq = node, d
+
+            diff = p[self.axis[node]] - q[self.axis[node]]
+            near, far = (self.left[node], self.right[node]) if diff < 0 else (self.right[node], self.left[node])
+
+            # Push the far side first so the near side is searched first
+            if far != -1:
+                stack.append((far, diff * diff))
+            if near != -1:
+                stack.append((near, bound))
+
+        if best == -1:
+            return None
+        return points[best], best // 2, math.sqrt(best_sq)
+
+
+# Drops every segment that retraces one already drawn, keeping the first occurrence
+def remove_redundant(segments: Sequence[Segment], tolerance: float = 1e-6) -> List[Segment]:
+    index = SegmentIndex((), tolerance=tolerance)
+    results = []
+    for seg in segments:
+        # Only kept segments are indexed, so a chain of near-misses can't drift away from what's actually drawn
+        if not index.duplicates_of(seg):
+            results.append(seg)
+            index.add(seg)
+    return results
+
+
+# Greedily reorders segments so that each one starts at the nearest unused endpoint to where the last one ended.
+# Segments may be reversed so that the nearest endpoint becomes the start.
+def reorder_nearest(segments: Sequence[Segment], start: Point = (0.0, 0.0)) -> List[Segment]:
+    index = SegmentIndex(segments)
+    results = []
+    cursor = start
+
+    for _ in range(len(index)):
+        endpoint, i, _ = index.nearest_endpoint(cursor)
+        index.discard_endpoints(i)
+
+        a, b = index.segments[i]
+        seg = (a, b) if endpoint == a else (b, a)
+        results.append(seg)
+        cursor = seg[1]
+
+    return results